@@ -1,5 +1,6 @@
 import os
 import time
+import asyncio
 import uuid
 import shutil
 import logging
@@ -9,9 +10,11 @@ from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 
 from color_pipeline import pipeline
 from optimization import optimizer
+import utils
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -28,24 +31,95 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # Mount static for downloading results
 app.mount("/outputs", StaticFiles(directory=OUTPUT_DIR), name="outputs")
 
+# Every grading job (mp4 and progressive) runs on this bounded pool so concurrent
+# requests queue up instead of competing for VRAM, and the event loop stays free
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", 1))
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS)
+
+# Progressive jobs keep running after /process returns; their state lives here
+# until JOB_TTL_SECONDS after they finish
+JOBS = {}
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 3600))
+FIRST_SEGMENT_POLL_INTERVAL = 0.25
+
 class ProcessResponse(BaseModel):
     processed_video_url: str
     processing_time: float
     used_gpu: str
     quality_mode_used: str
+    output_format: str = "mp4"
+    status: str = "completed"
+    skipped_frame_ratio: Optional[float] = None
+    graded_frame_ratio: Optional[float] = None
+
+class JobStatusResponse(BaseModel):
+    request_id: str
+    status: str
+    processed_video_url: str
+    processing_time: Optional[float] = None
+    skipped_frame_ratio: Optional[float] = None
+    graded_frame_ratio: Optional[float] = None
+    error: Optional[str] = None
+
+def _used_gpu():
+    return torch.cuda.get_device_name(0) if torch.cuda.is_available() else "CPU"
+
+def _cleanup_inputs(video_path, ref_path):
+    if os.path.exists(video_path):
+        os.remove(video_path)
+    if ref_path and os.path.exists(ref_path):
+        os.remove(ref_path)
+
+def _evict_finished_jobs():
+    now = time.time()
+    for request_id, job in list(JOBS.items()):
+        if job.get("finished_at") and now - job["finished_at"] > JOB_TTL_SECONDS:
+            JOBS.pop(request_id, None)
+
+def _run_job(request_id, start_time, video_path, ref_path, pipeline_kwargs):
+    job = JOBS[request_id]
+    job["status"] = "processing"
+    stats = {}
+    try:
+        pipeline.process_video(video_path=video_path, ref_image_path=ref_path, stats=stats, **pipeline_kwargs)
+        job["status"] = "completed"
+        job["skipped_frame_ratio"] = stats.get("skipped_ratio")
+        job["graded_frame_ratio"] = stats.get("graded_ratio")
+    except Exception as e:
+        logger.error(f"Error processing video {request_id}: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["processing_time"] = time.time() - start_time
+        job["finished_at"] = time.time()
+        _cleanup_inputs(video_path, ref_path)
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "gpu": torch.cuda.is_available()}
 
+@app.get("/jobs/{request_id}", response_model=JobStatusResponse)
+def job_status(request_id: str):
+    _evict_finished_jobs()
+    job = JOBS.get(request_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown request_id"})
+    return {"request_id": request_id, **job}
+
 @app.post("/process", response_model=ProcessResponse)
 async def process_video(
     video_file: UploadFile = File(...),
     reference_image: Optional[UploadFile] = File(None),
     quality_mode: str = Form("balanced"), # fast, balanced, high
     stabilization: bool = Form(True),
-    output_resolution: str = Form("auto")
+    output_resolution: str = Form("auto"),
+    output_format: str = Form("mp4"), # mp4, fmp4, hls (progressive)
+    skip_static_frames: bool = Form(False)
 ):
+    if output_format not in utils.OUTPUT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Unsupported output_format: {output_format}"})
+
+    _evict_finished_jobs()
     request_id = str(uuid.uuid4())
     logger.info(f"Received request {request_id}")
     
@@ -66,31 +140,69 @@ async def process_video(
             shutil.copyfileobj(reference_image.file, buffer)
             
     # Output Path
-    output_filename = f"{request_id}_output.mp4"
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
-    
+    if output_format == "hls":
+        output_path = os.path.join(OUTPUT_DIR, request_id)
+        processed_video_url = f"/outputs/{request_id}/{utils.HLS_PLAYLIST_NAME}"
+    else:
+        output_filename = f"{request_id}_output.mp4"
+        output_path = os.path.join(OUTPUT_DIR, output_filename)
+        # Construct URL (assuming local deployment accessible via same host)
+        # In production, upload to S3 and return S3 URL
+        processed_video_url = f"/outputs/{output_filename}"
+
+    pipeline_kwargs = dict(
+        quality_mode=quality_mode,
+        stabilization=stabilization,
+        output_resolution=output_resolution,
+        save_path=output_path,
+        output_format=output_format,
+        skip_static_frames=skip_static_frames
+    )
+
+    if output_format != "mp4":
+        # Progressive: grade in the background and hand out the URL once the first segment is on disk
+        JOBS[request_id] = {"status": "queued", "processed_video_url": processed_video_url}
+        job_future = JOB_EXECUTOR.submit(
+            _run_job, request_id, start_time, video_path, ref_path, pipeline_kwargs
+        )
+
+        while not job_future.done() and not utils.progressive_output_ready(output_path, output_format):
+            await asyncio.sleep(FIRST_SEGMENT_POLL_INTERVAL)
+
+        job = JOBS[request_id]
+        if job["status"] == "failed":
+            return JSONResponse(status_code=500, content={"error": job["error"]})
+
+        return {
+            "processed_video_url": processed_video_url,
+            "processing_time": time.time() - start_time, # time to first segment
+            "used_gpu": _used_gpu(),
+            "quality_mode_used": quality_mode,
+            "output_format": output_format,
+            "status": job["status"]
+        }
+
+    stats = {}
     try:
         # Run Pipeline
-        pipeline.process_video(
+        await asyncio.wrap_future(JOB_EXECUTOR.submit(
+            pipeline.process_video,
             video_path=video_path,
             ref_image_path=ref_path,
-            quality_mode=quality_mode,
-            stabilization=stabilization,
-            output_resolution=output_resolution,
-            save_path=output_path
-        )
+            stats=stats,
+            **pipeline_kwargs
+        ))
         
         processing_time = time.time() - start_time
         
-        # Construct URL (assuming local deployment accessible via same host)
-        # In production, upload to S3 and return S3 URL
-        processed_video_url = f"/outputs/{output_filename}"
-        
         return {
             "processed_video_url": processed_video_url,
             "processing_time": processing_time,
-            "used_gpu": torch.cuda.get_device_name(0) if torch.cuda.is_available() else "CPU",
-            "quality_mode_used": quality_mode
+            "used_gpu": _used_gpu(),
+            "quality_mode_used": quality_mode,
+            "output_format": output_format,
+            "skipped_frame_ratio": stats.get("skipped_ratio"),
+            "graded_frame_ratio": stats.get("graded_ratio")
         }
         
     except Exception as e:
@@ -98,10 +210,7 @@ async def process_video(
         return JSONResponse(status_code=500, content={"error": str(e)})
     finally:
         # Cleanup Inputs
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        if ref_path and os.path.exists(ref_path):
-            os.remove(ref_path)
+        _cleanup_inputs(video_path, ref_path)
 
 if __name__ == "__main__":
     import uvicorn
@@ -63,7 +63,24 @@ class ColorPipeline:
                       quality_mode="balanced", 
                       stabilization=True,
                       output_resolution="auto",
-                      save_path="output.mp4"):
+                      save_path="output.mp4",
+                      output_format="mp4",
+                      skip_static_frames=False,
+                      static_tolerance=2.0,
+                      stats=None):
+        """
+        output_format: "mp4" (default), "fmp4" or "hls".
+        The progressive formats are written batch by batch, so `save_path`
+        (a file for "fmp4", a directory holding the playlist for "hls")
+        becomes playable while grading is still running.
+
+        skip_static_frames: reuse the previously graded frame when a decoded frame
+        matches it within `static_tolerance` in every 8x8 tile (max abs difference
+        of tile means, in 0-255 units). Any local change - a subtitle, a cursor,
+        a 1 px line - moves its tile past the tolerance, so only near-identical
+        frames are reused. Helps screen recordings, slideshows, talking heads.
+        stats: optional dict, filled with frame counts and the share of skipped frames.
+        """
         
         self.load_resources()
         
@@ -103,44 +120,143 @@ class ColorPipeline:
             
         # 4. Process Frames
         logger.info(f"Applying grading to {total_frames} frames...")
-        processed_frames = []
+        logger.info(f"Writing {output_format} output to {save_path}...")
+        writer = utils.FFmpegWriter(save_path, fps=fps, output_format=output_format)
+        try:
+            frames_skipped, frames_graded = self._grade_frames(
+                vr, lut, total_frames, batch_size, quality_mode, writer,
+                skip_static_frames, static_tolerance,
+                progressive=output_format != "mp4"
+            )
+        except Exception:
+            writer.abort()
+            raise
+        # Raises if ffmpeg failed or the input had no frames
+        writer.close()
+        
+        skipped_ratio = frames_skipped / total_frames if total_frames else 0.0
+        graded_ratio = frames_graded / total_frames if total_frames else 0.0
+        if skip_static_frames:
+            logger.info(
+                f"Skipped {frames_skipped}/{total_frames} static frames ({skipped_ratio:.1%}), "
+                f"graded {frames_graded} incl. batch padding ({graded_ratio:.1%})"
+            )
+        if stats is not None:
+            stats.update(
+                frames_total=total_frames,
+                frames_skipped=frames_skipped,
+                frames_graded=frames_graded,
+                skipped_ratio=skipped_ratio,
+                graded_ratio=graded_ratio
+            )
+        
+        return save_path
+
+    def _grade_frames(self, vr, lut, total_frames, batch_size, quality_mode, writer,
+                      skip_static_frames=False, static_tolerance=2.0, progressive=False):
+        """
+        Grades and streams all frames. Returns (frames_skipped, frames_graded):
+        frames reused instead of graded, and frames pushed through lut_applier
+        (including batch padding).
+        """
+        frames_skipped = 0
+        frames_graded = 0
+        last_signature = None
+        last_graded = None
+        # Kept frames are graded in full `batch_size` batches: lut_applier is compiled
+        # with CUDA graphs, so every new batch shape would cost a recompile + capture
+        pending_frames = [] # kept frames awaiting grading
+        pending_output = [] # per output frame: index into pending_frames, -1 = last_graded
+        # Progressive outputs must not be held back by long static runs; plain mp4
+        # is unreadable until closed, so it only flushes full batches (no padding)
+        max_pending_output = batch_size * 4 if progressive else None
+        
+        def flush():
+            nonlocal last_graded, frames_graded
+            if pending_frames:
+                graded_frames = self._grade_batch(
+                    self._pad_batch(pending_frames, batch_size), lut, quality_mode,
+                    count=len(pending_frames)
+                )
+                frames_graded += batch_size
+            writer.write([graded_frames[k] if k >= 0 else last_graded for k in pending_output])
+            if pending_frames:
+                last_graded = graded_frames[len(pending_frames) - 1]
+            pending_frames.clear()
+            pending_output.clear()
         
         for i in tqdm(range(0, total_frames, batch_size)):
             # Load batch
             batch_indices = range(i, min(i + batch_size, total_frames))
             batch_frames = vr.get_batch(batch_indices).asnumpy()
             
-            # Preprocess
-            batch_tensor = torch.from_numpy(batch_frames).permute(0, 3, 1, 2).float() / 255.0 # B, C, H, W
-            batch_tensor = batch_tensor.to(optimizer.device)
-            
-            # Downscale if needed for speed (processing resolution)
-            orig_H, orig_W = batch_tensor.shape[2], batch_tensor.shape[3]
-            proc_tensor = batch_tensor
-            if quality_mode == "fast":
-                proc_tensor = F.interpolate(batch_tensor, scale_factor=0.5, mode='bilinear')
-            
-            # Apply LUT
-            with torch.no_grad(), optimizer.get_autocast_context():
-                graded_tensor = self.lut_applier(proc_tensor, lut)
-            
-            # Upscale back if downscaled
-            if quality_mode == "fast":
-                graded_tensor = F.interpolate(graded_tensor, size=(orig_H, orig_W), mode='bilinear')
-                
-            # Post-processing (Tone mapping, exposure - simplified)
-            # In a real pipeline, we might refine this. 
-            # Here we assume the LUT handles the look.
+            if not skip_static_frames:
+                writer.write(self._grade_batch(batch_frames, lut, quality_mode))
+                frames_graded += len(batch_frames)
+                continue
             
-            # Convert back to uint8
-            graded_frames = (graded_tensor.permute(0, 2, 3, 1) * 255.0).clamp(0, 255).byte().cpu().numpy()
-            processed_frames.extend(graded_frames)
+            # Compare against the last *graded* frame (not just the previous one)
+            # so slow drifts can't accumulate past the tolerance
+            for frame, signature in zip(batch_frames, self._frame_signatures(batch_frames)):
+                if last_signature is None or np.abs(signature - last_signature).max() > static_tolerance:
+                    if len(pending_frames) == batch_size:
+                        flush()
+                    pending_frames.append(frame)
+                    last_signature = signature
+                else:
+                    frames_skipped += 1
+                pending_output.append(len(pending_frames) - 1)
+                if max_pending_output and len(pending_output) >= max_pending_output:
+                    flush()
+        
+        if pending_output:
+            flush()
+        
+        return frames_skipped, frames_graded
+
+    def _pad_batch(self, frames, batch_size):
+        # Repeat the last frame so the graded batch always has the compiled shape
+        return np.stack(frames + [frames[-1]] * (batch_size - len(frames)))
 
-        # 5. Save Video
-        logger.info(f"Saving video to {save_path}...")
-        utils.save_video_ffmpeg(processed_frames, save_path, fps=fps)
+    def _frame_signatures(self, frames):
+        # Per-frame signature: mean of every 8x8 tile. Area averaging reads every pixel
+        # (no sampling grid to miss thin lines), and comparing tiles with max() keeps
+        # a small local change from being diluted by the rest of the frame
+        H, W = frames.shape[1], frames.shape[2]
+        tiles = ((W + 7) // 8, (H + 7) // 8)
+        return [cv2.resize(frame, tiles, interpolation=cv2.INTER_AREA).astype(np.float32) for frame in frames]
+
+    def _grade_batch(self, batch_frames, lut, quality_mode, count=None):
+        """
+        uint8 (B, H, W, 3) -> graded uint8 (count, H, W, 3).
+        `count` drops trailing padding frames before they are upscaled or copied to the host.
+        """
+        # Preprocess
+        batch_tensor = torch.from_numpy(batch_frames).permute(0, 3, 1, 2).float() / 255.0 # B, C, H, W
+        batch_tensor = batch_tensor.to(optimizer.device)
         
-        return save_path
+        # Downscale if needed for speed (processing resolution)
+        orig_H, orig_W = batch_tensor.shape[2], batch_tensor.shape[3]
+        proc_tensor = batch_tensor
+        if quality_mode == "fast":
+            proc_tensor = F.interpolate(batch_tensor, scale_factor=0.5, mode='bilinear')
+        
+        # Apply LUT
+        with torch.no_grad(), optimizer.get_autocast_context():
+            graded_tensor = self.lut_applier(proc_tensor, lut)
+        if count is not None:
+            graded_tensor = graded_tensor[:count]
+        
+        # Upscale back if downscaled
+        if quality_mode == "fast":
+            graded_tensor = F.interpolate(graded_tensor, size=(orig_H, orig_W), mode='bilinear')
+            
+        # Post-processing (Tone mapping, exposure - simplified)
+        # In a real pipeline, we might refine this. 
+        # Here we assume the LUT handles the look.
+        
+        # Convert back to uint8
+        return (graded_tensor.permute(0, 2, 3, 1) * 255.0).clamp(0, 255).byte().cpu().numpy()
 
     def _prepare_reference(self, ref_path, video_reader):
         if ref_path and os.path.exists(ref_path):
@@ -1,15 +1,18 @@
 import runpod
 import os
+import shutil
 import requests
 import uuid
 import torch
 import time
 from color_pipeline import pipeline
 from optimization import optimizer
+from storage import StreamingUpload, get_storage
 
 # Initialize pipeline once (Cold Start)
 print("Initializing Pipeline...")
 pipeline.load_resources()
+storage = get_storage()
 print("Pipeline Initialized.")
 
 def download_file(url, dest_path):
@@ -28,7 +31,8 @@ def handler(event):
             "reference_image_url": "http://... (optional)",
             "quality_mode": "balanced",
             "stabilization": true,
-            "output_resolution": "auto"
+            "output_resolution": "auto",
+            "skip_static_frames": false
         }
     }
     """
@@ -42,6 +46,7 @@ def handler(event):
     quality_mode = job_input.get("quality_mode", "balanced")
     stabilization = job_input.get("stabilization", True)
     output_resolution = job_input.get("output_resolution", "auto")
+    skip_static_frames = job_input.get("skip_static_frames", False)
     
     job_id = str(uuid.uuid4())
     temp_dir = f"/tmp/{job_id}"
@@ -51,6 +56,7 @@ def handler(event):
     ref_path = os.path.join(temp_dir, "ref_image.jpg") if ref_url else None
     output_path = os.path.join(temp_dir, "output.mp4")
     
+    upload = None
     try:
         # Download Inputs
         print(f"Downloading video from {video_url}")
@@ -60,42 +66,44 @@ def handler(event):
             print(f"Downloading reference from {ref_url}")
             download_file(ref_url, ref_path)
             
+        # Fragmented MP4 is append-only, so parts can be uploaded while later ones are still encoding
+        upload = StreamingUpload(storage, output_path, f"{job_id}/output.mp4").start()
+            
         # Process
         start_time = time.time()
+        stats = {}
         pipeline.process_video(
             video_path=video_path,
             ref_image_path=ref_path,
             quality_mode=quality_mode,
             stabilization=stabilization,
             output_resolution=output_resolution,
-            save_path=output_path
+            save_path=output_path,
+            output_format="fmp4",
+            skip_static_frames=skip_static_frames,
+            stats=stats
         )
         process_time = time.time() - start_time
         
-        # Upload Output (Assuming RunPod Bucket or you return the file bytes/base64 - usually bucket is better)
-        # For this template, we will assume the user has a way to upload or we return a presigned URL.
-        # But RunPod Serverless often handles the return value. 
-        # If we return a file path in some integrations, it uploads it.
-        # Here we will just return the path if running locally, or typically upload to S3.
-        # Since I don't have S3 credentials, I'll mock the upload or return status.
-        # Ideally, we should upload to an S3 bucket provided in env vars.
+        result = upload.finish()
+        upload = None
         
-        # For now, let's return a success message and metadata.
-        # In a real deployment, you would integrate boto3 here.
+        # Result is stored remotely, local copies are no longer needed
+        shutil.rmtree(temp_dir, ignore_errors=True)
         
         return {
             "status": "success",
             "processing_time": process_time,
-            "output_path": output_path, # In RunPod, this local path is lost. 
-            # TODO: Implement S3 upload
-            "message": "Video processed. Configure S3 to upload result." 
+            "skipped_frame_ratio": stats.get("skipped_ratio"),
+            "graded_frame_ratio": stats.get("graded_ratio"),
+            "output_url": result["url"],
+            "upload_timings": result["timings"]
         }
         
     except Exception as e:
+        # Keep temp_dir on failure for debugging
+        if upload is not None:
+            upload.abort()
         return {"error": str(e)}
-    finally:
-        # Cleanup
-        # shutil.rmtree(temp_dir) # Keep for debugging or cleanup
-        pass
 
 runpod.serverless.start({"handler": handler})
@@ -0,0 +1,264 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# S3 requires every part except the last to be at least 5 MiB
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_UPLOAD_WORKERS = 4
+
+class ResultStorage(ABC):
+    """
+    Multipart-style storage backend for graded results.
+    Backends implement begin/upload_part/complete/abort; StreamingUpload drives them.
+    """
+    @abstractmethod
+    def begin_upload(self, key):
+        pass
+
+    @abstractmethod
+    def upload_part(self, upload, part_number, data):
+        pass
+
+    @abstractmethod
+    def complete_upload(self, upload, parts):
+        """parts: list of (part_number, etag) sorted by part_number. Returns the result URL."""
+
+    @abstractmethod
+    def abort_upload(self, upload):
+        pass
+
+class S3MultipartStorage(ResultStorage):
+    """
+    S3-compatible backend (AWS, R2, MinIO, RunPod buckets) using multipart uploads.
+    Returns a presigned GET URL for the completed object.
+    """
+    def __init__(self, bucket, endpoint_url=None, access_key=None, secret_key=None,
+                 prefix="", url_expiry=7 * 24 * 3600):
+        try:
+            import boto3
+        except ImportError:
+            logger.error("boto3 is required for the S3 storage backend.")
+            raise
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_expiry = url_expiry
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None
+        )
+
+    def begin_upload(self, key):
+        key = f"{self.prefix}{key}"
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType="video/mp4")
+        return {"key": key, "upload_id": response["UploadId"]}
+
+    def upload_part(self, upload, part_number, data):
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=upload["key"], UploadId=upload["upload_id"],
+            PartNumber=part_number, Body=data
+        )
+        return response["ETag"]
+
+    def complete_upload(self, upload, parts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=upload["key"], UploadId=upload["upload_id"],
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": etag} for n, etag in parts]}
+        )
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": upload["key"]}, ExpiresIn=self.url_expiry
+        )
+
+    def abort_upload(self, upload):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=upload["key"], UploadId=upload["upload_id"])
+
+class LocalStorage(ResultStorage):
+    """
+    Filesystem stand-in for S3 (local runs and tests).
+    Parts are staged as separate files and concatenated on completion.
+    If base_url is set (e.g. a static file server over root_dir) the URL is HTTP, otherwise file://.
+    """
+    def __init__(self, root_dir, base_url=None):
+        self.root_dir = root_dir
+        self.base_url = base_url.rstrip("/") if base_url else None
+        os.makedirs(root_dir, exist_ok=True)
+
+    def begin_upload(self, key):
+        parts_dir = os.path.join(self.root_dir, ".parts", key.replace("/", "_"))
+        os.makedirs(parts_dir, exist_ok=True)
+        return {"key": key, "parts_dir": parts_dir}
+
+    def upload_part(self, upload, part_number, data):
+        with open(os.path.join(upload["parts_dir"], f"{part_number:05d}"), "wb") as f:
+            f.write(data)
+        return str(part_number)
+
+    def complete_upload(self, upload, parts):
+        dest_path = os.path.join(self.root_dir, upload["key"])
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        with open(dest_path, "wb") as dest:
+            for part_number, _ in parts:
+                with open(os.path.join(upload["parts_dir"], f"{part_number:05d}"), "rb") as src:
+                    shutil.copyfileobj(src, dest)
+        shutil.rmtree(upload["parts_dir"], ignore_errors=True)
+
+        if self.base_url:
+            return f"{self.base_url}/{upload['key']}"
+        return f"file://{os.path.abspath(dest_path)}"
+
+    def abort_upload(self, upload):
+        shutil.rmtree(upload["parts_dir"], ignore_errors=True)
+
+class StreamingUpload:
+    """
+    Uploads a file that is still being written (append-only, e.g. fragmented MP4)
+    as a multipart upload. A background thread tails the file and hands each full
+    part to a thread pool, so parts go up in parallel while later ones are encoded.
+
+    Usage:
+        upload = StreamingUpload(storage, path, key).start()
+        ... encode into path ...
+        result = upload.finish()  # {"url": ..., "timings": {...}}
+    """
+    def __init__(self, storage, path, key, part_size=DEFAULT_PART_SIZE,
+                 max_workers=DEFAULT_UPLOAD_WORKERS, poll_interval=0.2):
+        self.storage = storage
+        self.path = path
+        self.key = key
+        self.part_size = part_size
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Caps parts held in memory: reading waits for uploads when they fall behind encoding
+        self.part_slots = threading.Semaphore(max_workers * 2)
+        self.encoding_done = threading.Event()
+        self.cancelled = threading.Event()
+        self.futures = []
+        self.upload = None
+        self.bytes_uploaded = 0
+        self.tail_error = None
+        self.tail_thread = threading.Thread(target=self._tail, daemon=True)
+
+    def start(self):
+        self.start_time = time.time()
+        self.upload = self.storage.begin_upload(self.key)
+        self.tail_thread.start()
+        return self
+
+    def _acquire_part_slot(self):
+        while not self.cancelled.is_set():
+            if self.part_slots.acquire(timeout=self.poll_interval):
+                return True
+        return False
+
+    def _submit(self, data):
+        part_number = len(self.futures) + 1
+        self.bytes_uploaded += len(data)
+        future = self.executor.submit(self.storage.upload_part, self.upload, part_number, data)
+        future.add_done_callback(lambda _: self.part_slots.release())
+        self.futures.append((part_number, future))
+
+    def _tail(self):
+        offset = 0
+        try:
+            while not self.cancelled.is_set():
+                # Read the flag before sizing the file so nothing written afterwards is missed
+                done = self.encoding_done.is_set()
+                if done and not os.path.exists(self.path):
+                    raise FileNotFoundError(f"Output file was never written: {self.path}")
+                size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                if size - offset >= self.part_size or done:
+                    with open(self.path, "rb") as f:
+                        f.seek(offset)
+                        while size - offset >= self.part_size:
+                            if not self._acquire_part_slot():
+                                return
+                            self._submit(f.read(self.part_size))
+                            offset += self.part_size
+                        if done:
+                            # Last part may be smaller than part_size
+                            remainder = f.read()
+                            if not remainder and not self.futures:
+                                raise ValueError(f"Output file is empty: {self.path}")
+                            if remainder and self._acquire_part_slot():
+                                self._submit(remainder)
+                            return
+                time.sleep(self.poll_interval)
+        except Exception as e:
+            self.tail_error = e
+
+    def finish(self):
+        """Signal end of encoding, wait for the remaining parts and complete the upload."""
+        encode_end = time.time()
+        self.encoding_done.set()
+        self.tail_thread.join()
+        try:
+            if self.tail_error:
+                raise self.tail_error
+            parts = [(n, future.result()) for n, future in self.futures]
+            url = self.storage.complete_upload(self.upload, parts)
+        except Exception:
+            self.abort()
+            raise
+        self.upload = None
+        self.executor.shutdown(wait=False)
+
+        end = time.time()
+        return {
+            "url": url,
+            "timings": {
+                "upload_total_seconds": end - self.start_time,
+                # Upload time not hidden behind encoding: what the job actually waits for
+                "upload_after_encode_seconds": end - encode_end,
+                "parts": len(parts),
+                "bytes": self.bytes_uploaded
+            }
+        }
+
+    def abort(self):
+        """Stop tailing, drop queued parts, wait for in-flight ones, then abort the upload."""
+        self.cancelled.set()
+        if self.tail_thread.is_alive():
+            self.tail_thread.join()
+        for _, future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.upload is not None:
+            self.storage.abort_upload(self.upload)
+            self.upload = None
+
+def get_storage():
+    """
+    Backend from env: STORAGE_BACKEND=s3|local.
+    Defaults to S3 when BUCKET_NAME is set, else local storage under RESULTS_DIR.
+    """
+    backend = os.environ.get("STORAGE_BACKEND")
+    if not backend:
+        backend = "s3" if os.environ.get("BUCKET_NAME") else "local"
+        if backend == "local":
+            logger.warning(
+                "BUCKET_NAME is not set, falling back to local result storage. "
+                "Results stay on this worker and are lost when it exits; set the BUCKET_* "
+                "variables, or STORAGE_BACKEND=local to use local storage deliberately."
+            )
+    if backend == "s3":
+        return S3MultipartStorage(
+            bucket=os.environ["BUCKET_NAME"],
+            endpoint_url=os.environ.get("BUCKET_ENDPOINT_URL"),
+            access_key=os.environ.get("BUCKET_ACCESS_KEY_ID"),
+            secret_key=os.environ.get("BUCKET_SECRET_ACCESS_KEY"),
+            prefix=os.environ.get("BUCKET_PREFIX", "")
+        )
+    if backend == "local":
+        return LocalStorage(
+            root_dir=os.environ.get("RESULTS_DIR", "results"),
+            base_url=os.environ.get("RESULTS_BASE_URL")
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+
+import pytest
+
+from storage import LocalStorage, StreamingUpload
+
+PART_SIZE = 1000
+
+def _streaming_upload(tmp_path, src):
+    storage = LocalStorage(str(tmp_path / "results"), base_url="http://results.local/")
+    return StreamingUpload(storage, str(src), "job/output.mp4", part_size=PART_SIZE, poll_interval=0.01)
+
+def test_uploads_file_growing_during_upload(tmp_path):
+    src = tmp_path / "output.mp4"
+    data = os.urandom(10 * PART_SIZE + 500)
+    upload = _streaming_upload(tmp_path, src).start()
+
+    # Simulate the encoder appending fragments while parts are already being uploaded
+    def encode():
+        with open(src, "ab") as f:
+            for i in range(0, len(data), 700):
+                f.write(data[i:i + 700])
+                f.flush()
+                time.sleep(0.005)
+
+    encoder = threading.Thread(target=encode)
+    encoder.start()
+    encoder.join()
+    result = upload.finish()
+
+    assert result["url"] == "http://results.local/job/output.mp4"
+    assert (tmp_path / "results" / "job" / "output.mp4").read_bytes() == data
+    assert result["timings"]["parts"] == 11
+    assert result["timings"]["bytes"] == len(data)
+    assert os.listdir(tmp_path / "results" / ".parts") == []
+
+def test_missing_output_file_raises(tmp_path):
+    upload = _streaming_upload(tmp_path, tmp_path / "never_written.mp4").start()
+
+    with pytest.raises(FileNotFoundError):
+        upload.finish()
+    assert not (tmp_path / "results" / "job" / "output.mp4").exists()
+
+def test_empty_output_file_raises(tmp_path):
+    src = tmp_path / "output.mp4"
+    src.write_bytes(b"")
+    upload = _streaming_upload(tmp_path, src).start()
+
+    with pytest.raises(ValueError):
+        upload.finish()
+    assert not (tmp_path / "results" / "job" / "output.mp4").exists()
+
+class SlowStorage(LocalStorage):
+    def upload_part(self, upload, part_number, data):
+        time.sleep(0.02)
+        return super().upload_part(upload, part_number, data)
+
+def test_parts_in_memory_are_bounded_when_upload_is_slow(tmp_path):
+    src = tmp_path / "output.mp4"
+    data = os.urandom(20 * PART_SIZE)
+    src.write_bytes(data)
+    storage = SlowStorage(str(tmp_path / "results"))
+    upload = StreamingUpload(storage, str(src), "job/output.mp4", part_size=PART_SIZE,
+                             max_workers=2, poll_interval=0.01)
+
+    max_pending = 0
+    submit = upload._submit
+    def tracking_submit(part):
+        nonlocal max_pending
+        submit(part)
+        max_pending = max(max_pending, sum(not future.done() for _, future in upload.futures))
+    upload._submit = tracking_submit
+
+    upload.start()
+    upload.finish()
+
+    assert max_pending <= 4
+    assert (tmp_path / "results" / "job" / "output.mp4").read_bytes() == data
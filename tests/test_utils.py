@@ -0,0 +1,74 @@
+import shutil
+
+import pytest
+
+# utils pulls in the full media stack at import time
+for module in ("numpy", "cv2", "torch", "PIL", "ffmpeg"):
+    pytest.importorskip(module)
+
+import numpy as np
+
+import utils
+
+def _box(box_type, payload_size):
+    return (8 + payload_size).to_bytes(4, "big") + box_type + b"\0" * payload_size
+
+def _large_box(box_type, payload_size):
+    # size == 1 -> 64-bit largesize follows the type
+    return (1).to_bytes(4, "big") + box_type + (16 + payload_size).to_bytes(8, "big") + b"\0" * payload_size
+
+HEADER = _box(b"ftyp", 12) + _box(b"moov", 100)
+
+def _fmp4_ready(tmp_path, data):
+    path = tmp_path / "output.mp4"
+    path.write_bytes(data)
+    return utils.progressive_output_ready(str(path), "fmp4")
+
+def test_fmp4_ready_with_complete_fragment(tmp_path):
+    assert _fmp4_ready(tmp_path, HEADER + _box(b"moof", 50) + _box(b"mdat", 1000))
+
+def test_fmp4_not_ready_with_truncated_mdat(tmp_path):
+    data = HEADER + _box(b"moof", 50) + _box(b"mdat", 1000)
+    assert not _fmp4_ready(tmp_path, data[:-1])
+
+def test_fmp4_not_ready_with_moof_only(tmp_path):
+    assert not _fmp4_ready(tmp_path, HEADER + _box(b"moof", 50))
+
+def test_fmp4_not_ready_with_header_only(tmp_path):
+    assert not _fmp4_ready(tmp_path, HEADER)
+
+def test_fmp4_ready_with_largesize_mdat(tmp_path):
+    data = HEADER + _box(b"moof", 50) + _large_box(b"mdat", 1000)
+    assert _fmp4_ready(tmp_path, data)
+    assert not _fmp4_ready(tmp_path, data[:-10])
+
+def test_fmp4_not_ready_when_missing(tmp_path):
+    assert not utils.progressive_output_ready(str(tmp_path / "missing.mp4"), "fmp4")
+
+def test_hls_ready_only_after_first_segment(tmp_path):
+    assert not utils.progressive_output_ready(str(tmp_path), "hls")
+
+    playlist = tmp_path / utils.HLS_PLAYLIST_NAME
+    playlist.write_text("#EXTM3U\n#EXT-X-VERSION:7\n#EXT-X-MAP:URI=\"init.mp4\"\n")
+    assert not utils.progressive_output_ready(str(tmp_path), "hls")
+
+    playlist.write_text(playlist.read_text() + "#EXTINF:2.000000,\nsegment_00000.m4s\n")
+    assert utils.progressive_output_ready(str(tmp_path), "hls")
+
+def test_writer_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        utils.FFmpegWriter(str(tmp_path / "out.mkv"), output_format="mkv")
+
+def test_writer_close_without_frames_raises(tmp_path):
+    writer = utils.FFmpegWriter(str(tmp_path / "out.mp4"))
+    with pytest.raises(ValueError):
+        writer.close()
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg binary not installed")
+def test_writer_surfaces_ffmpeg_failure(tmp_path):
+    # Output directory does not exist, so ffmpeg cannot open the target and exits non-zero
+    writer = utils.FFmpegWriter(str(tmp_path / "missing_dir" / "out.mp4"))
+    frames = np.zeros((4, 16, 16, 3), dtype=np.uint8)
+    with pytest.raises(RuntimeError):
+        writer.write(frames)
+        writer.close()
@@ -1,3 +1,5 @@
+import os
+import threading
 import cv2
 import numpy as np
 import torch
@@ -10,25 +12,157 @@ def load_image(path, target_size=None):
         img = img.resize(target_size, Image.Resampling.LANCZOS)
     return np.array(img)
 
+OUTPUT_FORMATS = ("mp4", "fmp4", "hls")
+HLS_PLAYLIST_NAME = "playlist.m3u8"
+
+class FFmpegWriter:
+    """
+    Streams raw RGB frames into an ffmpeg encoder as they are produced.
+
+    output_format:
+        "mp4"  - regular MP4, playable once the writer is closed
+        "fmp4" - fragmented MP4 (empty moov + moof per keyframe), readable while growing
+        "hls"  - fMP4 HLS segments plus a live (EVENT) playlist in the output directory
+    For "hls", output_path is the directory holding the playlist and segments.
+    """
+    def __init__(self, output_path, fps=30, output_format="mp4", segment_time=2):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output_format: {output_format}")
+        self.output_path = output_path
+        self.fps = fps
+        self.output_format = output_format
+        self.segment_time = segment_time
+        self.process = None
+        self.frames_written = 0
+        self._stderr = []
+        self._stderr_thread = None
+
+    def _open(self, width, height):
+        encode_args = dict(pix_fmt='yuv420p', vcodec='libx264', crf=18)
+        if self.output_format != "mp4":
+            # Force a keyframe at every segment boundary so fragments/segments have a fixed cadence
+            encode_args['force_key_frames'] = 'expr:gte(t,n_forced*{})'.format(self.segment_time)
+        target = self.output_path
+        if self.output_format == "fmp4":
+            encode_args['movflags'] = 'frag_keyframe+empty_moov+default_base_moof'
+        elif self.output_format == "hls":
+            os.makedirs(self.output_path, exist_ok=True)
+            target = os.path.join(self.output_path, HLS_PLAYLIST_NAME)
+            encode_args.update(
+                f='hls',
+                hls_time=self.segment_time,
+                hls_list_size=0,
+                hls_playlist_type='event',
+                hls_segment_type='fmp4',
+                hls_fmp4_init_filename='init.mp4',
+                hls_segment_filename=os.path.join(self.output_path, 'segment_%05d.m4s')
+            )
+
+        self.process = (
+            ffmpeg
+            .input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(width, height), r=self.fps)
+            .output(target, **encode_args)
+            .global_args('-loglevel', 'error')
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+        # Drain stderr in the background so a chatty encoder can never block on a full pipe
+        self._stderr_thread = threading.Thread(
+            target=lambda: self._stderr.append(self.process.stderr.read()), daemon=True
+        )
+        self._stderr_thread.start()
+
+    def _wait(self):
+        self.process.wait()
+        self._stderr_thread.join()
+        returncode = self.process.returncode
+        stderr = b"".join(self._stderr).decode(errors='replace').strip()
+        self.process = None
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}: {stderr}")
+
+    def write(self, frames):
+        for frame in frames:
+            if self.process is None:
+                height, width, _ = frame.shape
+                self._open(width, height)
+            try:
+                self.process.stdin.write(frame.astype(np.uint8).tobytes())
+            except BrokenPipeError:
+                # Encoder died; surface its exit code and stderr instead of the pipe error
+                self._wait()
+                raise
+            self.frames_written += 1
+
+    def close(self):
+        if self.process is None:
+            if self.frames_written == 0:
+                raise ValueError(f"No frames were written to {self.output_path}")
+            return
+        self.process.stdin.close()
+        self._wait()
+
+    def abort(self):
+        """Stops the encoder without checking its result (used when grading itself failed)."""
+        if self.process is None:
+            return
+        self.process.kill()
+        self.process.wait()
+        self.process = None
+
+def progressive_output_ready(output_path, output_format):
+    """
+    True once a progressive output has its first playable segment/fragment on disk.
+    """
+    if output_format == "hls":
+        playlist = os.path.join(output_path, HLS_PLAYLIST_NAME)
+        if not os.path.exists(playlist):
+            return False
+        with open(playlist, 'r') as f:
+            return "#EXTINF" in f.read()
+    if output_format == "fmp4":
+        if not os.path.exists(output_path):
+            return False
+        return _has_complete_fragment(output_path)
+    return False
+
+def _has_complete_fragment(path):
+    """
+    Walks the top-level MP4 boxes and reports whether a moof is followed by an mdat
+    that is fully on disk (ffmpeg flushes in buffer-sized chunks, so a moof alone
+    does not mean its media data has been written yet).
+    """
+    file_size = os.path.getsize(path)
+    seen_moof = False
+    offset = 0
+    with open(path, 'rb') as f:
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(16)
+            box_size = int.from_bytes(header[0:4], 'big')
+            box_type = header[4:8]
+            if box_size == 1:
+                if len(header) < 16:
+                    return False
+                box_size = int.from_bytes(header[8:16], 'big') # 64-bit largesize
+            elif box_size == 0:
+                return False # box runs to end of file, still being written
+            if box_size < 8 or offset + box_size > file_size:
+                return False
+            if box_type == b'moof':
+                seen_moof = True
+            elif box_type == b'mdat' and seen_moof:
+                return True
+            offset += box_size
+    return False
+
 def save_video_ffmpeg(frames, output_path, fps=30):
     if not frames:
         return
-    
-    height, width, _ = frames[0].shape
-    
-    process = (
-        ffmpeg
-        .input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(width, height), r=fps)
-        .output(output_path, pix_fmt='yuv420p', vcodec='libx264', crf=18)
-        .overwrite_output()
-        .run_async(pipe_stdin=True)
-    )
-
-    for frame in frames:
-        process.stdin.write(frame.astype(np.uint8).tobytes())
-    
-    process.stdin.close()
-    process.wait()
+
+    writer = FFmpegWriter(output_path, fps=fps)
+    writer.write(frames)
+    writer.close()
 
 def tensor_to_numpy(tensor):
     return tensor.detach().cpu().numpy().transpose(1, 2, 0) # C, H, W -> H, W, C